@@ -21,9 +21,12 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import argparse, os, sys
+import argparse, os, queue, sys
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import tritonclient.grpc
+import tritonclient.utils.shared_memory as shm
+from tritonclient.utils import triton_to_np_dtype
 from PIL import Image
 
 
@@ -39,12 +42,20 @@ def parse_args():
                         help='Number of iterations , with `batch_size` size')
     parser.add_argument('--model_name', type=str, required=False, default="dali_backend",
                         help='Model name')
+    parser.add_argument('--max_in_flight', type=int, required=False, default=4,
+                        help='Maximum number of requests, that are sent to the server and not yet completed')
+    parser.add_argument('--shared_memory', action="store_true", required=False, default=False,
+                        help='Transfer inputs and outputs through system shared memory. '
+                             'Works only if the client and the server run on the same host')
     img_group = parser.add_mutually_exclusive_group()
     img_group.add_argument('--img', type=str, required=False, default=None,
                            help='Run a img dali pipeline. Arg: path to the image.')
     img_group.add_argument('--img_dir', type=str, required=False, default=None,
                            help='Directory, with images that will be broken down into batches an infered. The directory must contain images only')
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.max_in_flight < 1:
+        parser.error("--max_in_flight must be at least 1")
+    return args
 
 
 def load_image(img_path: str):
@@ -53,36 +64,36 @@ def load_image(img_path: str):
     This is a typical approach you want to use in DALI backend
     """
     with open(img_path, "rb") as f:
-        img = f.read()
-        return np.array(list(img)).astype(np.uint8)
+        return np.frombuffer(f.read(), dtype=np.uint8)
 
 
 def load_images(dir_path: str):
     """
     Loads all files in given dir_path. Treats them as images
     """
-    images = []
+    if os.path.isfile(dir_path):
+        img_paths = [dir_path]
+    else:
+        # Traverses directory for files (not dirs) and returns full paths to them
+        with os.scandir(dir_path) as entries:
+            img_paths = [entry.path for entry in entries if entry.is_file()]
 
-    # Traverses directory for files (not dirs) and returns full paths to them
-    path_generator = (os.path.join(dir_path, f) for f in os.listdir(dir_path) if
-                      os.path.isfile(os.path.join(dir_path, f)))
-
-    img_paths = [dir_path] if os.path.isfile(dir_path) else list(path_generator)
-    for img in img_paths:
-        images.append(load_image(img))
-    return images
+    # Reading files is I/O bound and releases the GIL, so the reads can overlap
+    with ThreadPoolExecutor(max_workers=min(32, len(img_paths))) as executor:
+        return list(executor.map(load_image, img_paths))
 
 
 def array_from_list(arrays):
     """
     Convert list of ndarrays to single ndarray with ndims+=1
     """
-    lengths = list(map(lambda x, arr=arrays: arr[x].shape[0], [x for x in range(len(arrays))]))
-    max_len = max(lengths)
-    arrays = list(map(lambda arr, ml=max_len: np.pad(arr, ((0, ml - arr.shape[0]))), arrays))
-    for arr in arrays:
-        assert arr.shape == arrays[0].shape, "Arrays must have the same shape"
-    return np.stack(arrays)
+    assert all(arr.shape[1:] == arrays[0].shape[1:] for arr in arrays), "Arrays must have the same shape"
+    max_len = max(arr.shape[0] for arr in arrays)
+    # Pad with zeros by copying every array into a single preallocated buffer
+    result = np.zeros((len(arrays), max_len) + arrays[0].shape[1:], dtype=arrays[0].dtype)
+    for i, arr in enumerate(arrays):
+        result[i, :arr.shape[0]] = arr
+    return result
 
 
 def batcher(dataset, batch_size, n_iterations=-1):
@@ -107,13 +118,67 @@ def save_byte_image(bytes, size_wh=(224, 224), name_suffix=0):
     im.save("result_img_" + str(name_suffix) + ".jpg")
 
 
+def print_results(output0_data, batch_idx):
+    """
+    Prints a summary of the inference results for the batch with given index
+    """
+    print("Batch ", batch_idx, " - output mean after backend processing:", np.mean(output0_data))
+    print("Output shape: ", np.shape(output0_data))
+    maxs = np.argmax(output0_data, axis=1)
+    top_conf = output0_data[np.arange(len(maxs)), maxs]
+    for i, (label, conf) in enumerate(zip(maxs, top_conf)):
+        print("Sample ", i, " - label: ", label, " ~ ", conf)
+
+
+def output_byte_size(triton_client, model_name, output_name, batch_size):
+    """
+    Returns the size of the model output for given batch size, or None, if the output shape is not static
+    """
+    metadata = triton_client.get_model_metadata(model_name)
+    output = next((out for out in metadata.outputs if out.name == output_name), None)
+    if output is None:
+        raise ValueError("Model " + model_name + " has no output named " + output_name)
+    # The output shape starts with the batch dimension only if the model supports batching
+    output_shape = list(output.shape)
+    if triton_client.get_model_config(model_name).config.max_batch_size > 0:
+        output_shape[0] = batch_size
+    if any(dim < 0 for dim in output_shape):
+        return None
+    return int(np.prod(output_shape)) * np.dtype(triton_to_np_dtype(output.datatype)).itemsize
+
+
+def create_shm_region(triton_client, region_name, byte_size):
+    """
+    Creates system shared memory region and registers it in the server.
+    Returns the region name together with its handle
+    """
+    shm_key = "/" + region_name
+    shm_handle = shm.create_shared_memory_region(region_name, shm_key, byte_size)
+    try:
+        triton_client.register_system_shared_memory(region_name, shm_key, byte_size)
+    except Exception:
+        shm.destroy_shared_memory_region(shm_handle)
+        raise
+    return region_name, shm_handle
+
+
+def destroy_shm_region(triton_client, region_name, shm_handle):
+    """
+    Unregisters system shared memory region from the server and destroys it
+    """
+    try:
+        triton_client.unregister_system_shared_memory(region_name)
+    finally:
+        shm.destroy_shared_memory_region(shm_handle)
+
+
 def main():
     FLAGS = parse_args()
     try:
         triton_client = tritonclient.grpc.InferenceServerClient(url=FLAGS.url, verbose=FLAGS.verbose)
     except Exception as e:
         print("channel creation failed: " + str(e))
-        sys.exit()
+        sys.exit(1)
 
     model_name = FLAGS.model_name
     model_version = -1
@@ -135,23 +200,74 @@ def main():
     inputs.append(tritonclient.grpc.InferInput(input_name, input_shape, "UINT8"))
     outputs.append(tritonclient.grpc.InferRequestedOutput(output_name))
 
-    for batch in batcher(image_data, FLAGS.batch_size):
-        print("Input mean before backend processing:", np.mean(batch))
-        # Initialize the data
-        inputs[0].set_data_from_numpy(batch)
-
-        # Test with outputs
-        results = triton_client.infer(model_name=model_name,
-                                      inputs=inputs,
-                                      outputs=outputs)
-
-        # Get the output arrays from the results
-        output0_data = results.as_numpy(output_name)
-        print("Output mean after backend processing:", np.mean(output0_data))
-        print("Output shape: ", np.shape(output0_data))
-        maxs = np.argmax(output0_data, axis=1)
-        for i in range(len(maxs)):
-            print("Sample ", i, " - label: ", maxs[i], " ~ ", output0_data[i, maxs[i]])
+    # Every request in flight uses its own slot, i.e. its own pair of shared memory regions
+    input_byte_size = int(np.prod(input_shape)) * image_data.itemsize
+    input_regions = []
+    output_regions = []
+
+    # Keep up to `max_in_flight` requests on the server, so it doesn't wait for the client
+    max_in_flight = FLAGS.max_in_flight
+    free_slots = list(range(max_in_flight))
+    completed_requests = queue.Queue()
+
+    def process_completed_request():
+        slot, batch_idx, results, error = completed_requests.get()
+        if error is not None:
+            print("inference failed for batch " + str(batch_idx) + ": " + str(error))
+            sys.exit(1)
+        if output_regions:
+            output = results.get_output(output_name)
+            output_shm = output_regions[slot][1]
+            output0_data = shm.get_contents_as_numpy(output_shm, triton_to_np_dtype(output.datatype), output.shape)
+        else:
+            output0_data = results.as_numpy(output_name)
+        print_results(output0_data, batch_idx)
+        free_slots.append(slot)
+
+    try:
+        if FLAGS.shared_memory:
+            output_slot_size = output_byte_size(triton_client, model_name, output_name, FLAGS.batch_size)
+            for slot in range(max_in_flight):
+                region_suffix = str(os.getpid()) + "_" + str(slot)
+                input_regions.append(create_shm_region(triton_client, "dali_client_input_" + region_suffix,
+                                                       input_byte_size))
+                if output_slot_size is not None:
+                    output_regions.append(create_shm_region(triton_client,
+                                                            "dali_client_output_" + region_suffix,
+                                                            output_slot_size))
+
+        for batch_idx, batch in enumerate(batcher(image_data, FLAGS.batch_size)):
+            if not free_slots:
+                process_completed_request()
+            slot = free_slots.pop()
+
+            print("Batch ", batch_idx, " - input mean before backend processing:", np.mean(batch))
+            # Initialize the data
+            if input_regions:
+                input_region, input_shm = input_regions[slot]
+                shm.set_shared_memory_region(input_shm, [batch])
+                inputs[0].set_shared_memory(input_region, input_byte_size)
+            else:
+                inputs[0].set_data_from_numpy(batch)
+            if output_regions:
+                outputs[0].set_shared_memory(output_regions[slot][0], output_slot_size)
+
+            # Test with outputs. The request is serialized before `async_infer` returns,
+            # so `inputs` and `outputs` can be reused right away.
+            # Requests can complete out of order, so the batch index is passed along with the results
+            triton_client.async_infer(
+                model_name=model_name, inputs=inputs, outputs=outputs,
+                callback=lambda result, error, slot=slot, batch_idx=batch_idx:
+                completed_requests.put((slot, batch_idx, result, error)))
+
+        while len(free_slots) < max_in_flight:
+            process_completed_request()
+    finally:
+        for region_name, shm_handle in input_regions + output_regions:
+            try:
+                destroy_shm_region(triton_client, region_name, shm_handle)
+            except Exception as e:
+                print("failed to release shared memory region " + region_name + ": " + str(e))
 
     statistics = triton_client.get_inference_statistics(model_name="dali")
     if len(statistics.model_stats) != 1:
@@ -25,7 +25,7 @@ import argparse
 
 
 def main(filename):
-    pipe = dali.pipeline.Pipeline(batch_size=3, num_threads=1, device_id=0)
+    pipe = dali.pipeline.Pipeline(batch_size=3, num_threads=4, device_id=0)
     with pipe:
         images = dali.fn.external_source(device="cpu", name="DALI_INPUT_0")
         images = dali.fn.image_decoder(images, device="mixed", output_type=types.RGB)
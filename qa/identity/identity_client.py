@@ -49,12 +49,13 @@ def array_from_list(arrays):
     """
     Convert list of ndarrays to single ndarray with ndims+=1
     """
-    lengths = list(map(lambda x, arr=arrays: arr[x].shape[0], [x for x in range(len(arrays))]))
-    max_len = max(lengths)
-    arrays = list(map(lambda arr, ml=max_len: np.pad(arr, ((0, ml - arr.shape[0]))), arrays))
-    for arr in arrays:
-        assert arr.shape == arrays[0].shape, "Arrays must have the same shape"
-    return np.stack(arrays)
+    assert all(arr.shape[1:] == arrays[0].shape[1:] for arr in arrays), "Arrays must have the same shape"
+    max_len = max(arr.shape[0] for arr in arrays)
+    # Pad with zeros by copying every array into a single preallocated buffer
+    result = np.zeros((len(arrays), max_len) + arrays[0].shape[1:], dtype=arrays[0].dtype)
+    for i, arr in enumerate(arrays):
+        result[i, :arr.shape[0]] = arr
+    return result
 
 
 def batcher(dataset, max_batch_size, n_iterations=-1):
@@ -92,13 +93,14 @@ def main():
     input_name = "DALI_INPUT_0"
     output_name = "DALI_OUTPUT_0"
     input_shape = list(input_data.shape)
+    inputs = [tritongrpcclient.InferInput(input_name, input_shape, "UINT8")]
     outputs.append(tritongrpcclient.InferRequestedOutput(output_name))
 
     for batch in batcher(input_data, FLAGS.batch_size):
         print("Input mean before backend processing:", np.mean(batch))
         input_shape[0] = np.shape(batch)[0]
         print("Batch size: ", input_shape[0])
-        inputs = [tritongrpcclient.InferInput(input_name, input_shape, "UINT8")]
+        inputs[0].set_shape(input_shape)
         # Initialize the data
         inputs[0].set_data_from_numpy(batch)
 
@@ -23,6 +23,7 @@
 
 import argparse, os, sys
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from numpy.random import randint
 import tritongrpcclient
 from PIL import Image
@@ -56,30 +57,31 @@ def load_image(img_path: str):
     This is a typical approach you want to use in DALI backend
     """
     with open(img_path, "rb") as f:
-        img = f.read()
-        return np.array(list(img)).astype(np.uint8)
+        return np.frombuffer(f.read(), dtype=np.uint8)
 
 
 def load_images(dir_path: str):
     """
     Loads all files in given dir_path. Treats them as images
     """
-    images = []
-    labels = []
     labels_fname = 'labels.txt'
 
-    # Traverses directory for files (not dirs) and returns full paths to them
-    path_generator = (os.path.join(dir_path, f) for f in os.listdir(dir_path) if
-                      os.path.isfile(os.path.join(dir_path, f)) and f != labels_fname)
-    img_paths = [dir_path] if os.path.isfile(dir_path) else list(path_generator)
+    if os.path.isfile(dir_path):
+        img_paths = [dir_path]
+    else:
+        # Traverses directory for files (not dirs) and returns full paths to them
+        with os.scandir(dir_path) as entries:
+            img_paths = [entry.path for entry in entries if entry.is_file() and entry.name != labels_fname]
 
     # File to dictionary
     with open(os.path.join(dir_path, labels_fname)) as f:
         labels_dict = {k: int(v) for line in f for (k, v) in [line.strip().split(None, 1)]}
 
-    for img in img_paths:
-        images.append(load_image(img))
-        labels.append(labels_dict[os.path.basename(img)])
+    labels = [labels_dict[os.path.basename(img)] for img in img_paths]
+
+    # Reading files is I/O bound and releases the GIL, so the reads can overlap
+    with ThreadPoolExecutor(max_workers=min(32, len(img_paths))) as executor:
+        images = list(executor.map(load_image, img_paths))
     return images, labels
 
 
@@ -87,12 +89,13 @@ def array_from_list(arrays):
     """
     Convert list of ndarrays to single ndarray with ndims+=1
     """
-    lengths = list(map(lambda x, arr=arrays: arr[x].shape[0], [x for x in range(len(arrays))]))
-    max_len = max(lengths)
-    arrays = list(map(lambda arr, ml=max_len: np.pad(arr, ((0, ml - arr.shape[0]))), arrays))
-    for arr in arrays:
-        assert arr.shape == arrays[0].shape, "Arrays must have the same shape"
-    return np.stack(arrays)
+    assert all(arr.shape[1:] == arrays[0].shape[1:] for arr in arrays), "Arrays must have the same shape"
+    max_len = max(arr.shape[0] for arr in arrays)
+    # Pad with zeros by copying every array into a single preallocated buffer
+    result = np.zeros((len(arrays), max_len) + arrays[0].shape[1:], dtype=arrays[0].dtype)
+    for i, arr in enumerate(arrays):
+        result[i, :arr.shape[0]] = arr
+    return result
 
 
 def batcher(dataset, max_batch_size, n_iterations=-1):
@@ -141,6 +144,7 @@ def main():
     input_name = "INPUT"
     output_name = "OUTPUT"
     input_shape = list(image_data.shape)
+    inputs = [tritongrpcclient.InferInput(input_name, input_shape, "UINT8")]
     outputs.append(tritongrpcclient.InferRequestedOutput(output_name))
 
     img_idx = 0
@@ -148,7 +152,7 @@ def main():
         print("Input mean before backend processing:", np.mean(batch))
         input_shape[0] = np.shape(batch)[0]
         print("Batch size: ", input_shape[0])
-        inputs = [tritongrpcclient.InferInput(input_name, input_shape, "UINT8")]
+        inputs[0].set_shape(input_shape)
         # Initialize the data
         inputs[0].set_data_from_numpy(batch)
 
@@ -162,9 +166,10 @@ def main():
         print("Output mean after backend processing:", np.mean(output0_data))
         print("Output shape: ", np.shape(output0_data))
         maxs = np.argmax(output0_data, axis=1)
-        for i in range(len(maxs)):
-            print("Sample ", i, " - label: ", maxs[i], " ~ ", output0_data[i, maxs[i]])
-            if maxs[i] != labels[img_idx]:
+        top_conf = output0_data[np.arange(len(maxs)), maxs]
+        for i, (label, conf) in enumerate(zip(maxs, top_conf)):
+            print("Sample ", i, " - label: ", label, " ~ ", conf)
+            if label != labels[img_idx]:
                 sys.exit(1)
             else:
                 print("pass")
@@ -49,12 +49,13 @@ def array_from_list(arrays):
     """
     Convert list of ndarrays to single ndarray with ndims+=1
     """
-    lengths = list(map(lambda x, arr=arrays: arr[x].shape[0], [x for x in range(len(arrays))]))
-    max_len = max(lengths)
-    arrays = list(map(lambda arr, ml=max_len: np.pad(arr, ((0, ml - arr.shape[0]))), arrays))
-    for arr in arrays:
-        assert arr.shape == arrays[0].shape, "Arrays must have the same shape"
-    return np.stack(arrays)
+    assert all(arr.shape[1:] == arrays[0].shape[1:] for arr in arrays), "Arrays must have the same shape"
+    max_len = max(arr.shape[0] for arr in arrays)
+    # Pad with zeros by copying every array into a single preallocated buffer
+    result = np.zeros((len(arrays), max_len) + arrays[0].shape[1:], dtype=arrays[0].dtype)
+    for i, arr in enumerate(arrays):
+        result[i, :arr.shape[0]] = arr
+    return result
 
 
 def batcher(dataset, max_batch_size, n_iterations=-1):
@@ -92,6 +93,7 @@ def main():
     input_names = ["DALI_X_INPUT", "DALI_Y_INPUT"]
     output_names = ["DALI_OUTPUT_X", "DALI_OUTPUT_Y"]
     input_shape = list(input_data.shape)
+    inputs = [tritonclient.grpc.InferInput(iname, input_shape, "UINT8") for iname in input_names]
     for oname in output_names:
         outputs.append(tritonclient.grpc.InferRequestedOutput(oname))
 
@@ -100,9 +102,9 @@ def main():
         # Initialize the data
         input_shape[0] = np.shape(batch)[0]
         print("Batch size: ", input_shape[0])
-        inputs = [tritonclient.grpc.InferInput(iname, input_shape, "UINT8") for iname in input_names]
         for inp in inputs:
-            inp.set_data_from_numpy(np.copy(batch))
+            inp.set_shape(input_shape)
+            inp.set_data_from_numpy(batch)
 
         # Test with outputs
         results = triton_client.infer(model_name=model_name,